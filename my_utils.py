@@ -74,6 +74,137 @@ def scrape_directory(path, flag, recursive=True):
     else: returned_files = catalog
     return returned_files
 
+_array_extensions = ('.npy', '.csv', '.txt')
+
+def load_array(fname, mmap=True):
+    '''
+    Loads a numeric array from disk, choosing the reader by file extension.
+    .npy files are memory-mapped read-only by default, so pages are only
+    pulled from disk as they are touched. .csv and .txt files are read in a
+    single pass into a 2D array.
+
+    Input:
+    --------
+    fname : str
+        Name of file to be loaded
+    mmap : bool
+        If true, .npy files are opened with mmap_mode='r' (default mmap=True)
+
+    Output:
+    --------
+    array : numpy.array
+        Contents of fname
+    '''
+    import os
+    import numpy as np
+    ext = os.path.splitext(fname)[1].lower()
+    if ext not in _array_extensions:
+        raise ValueError('Unsupported file type: %s'%ext)
+    if ext == '.npy':
+        return np.load(fname, mmap_mode='r' if mmap else None)
+    delimiter = ',' if ext == '.csv' else None
+    return np.loadtxt(fname, delimiter=delimiter, ndmin=2)
+
+def _load_and_reduce(fname, f, f_args, f_kwds):
+    '''
+    Worker for process_directory. The file is opened inside the worker
+    process, so only the result of f is sent back to the caller.
+    '''
+    return f(load_array(fname), *f_args, **f_kwds)
+
+def process_directory(path, flag, f, f_args=(), f_kwds=None, recursive=True,
+                      cores=None, buffer=None, ordered=True):
+    '''
+    Streams files found by scrape_directory through a load-and-reduce
+    pipeline. Each file is handed to a pool of worker processes, which open
+    it with load_array and evaluate f(array, *f_args, **f_kwds). While one
+    worker waits on disk another can compute, and no more than "buffer"
+    files are in flight at once, regardless of how many files are found.
+
+    Only files load_array can read (.npy, .csv and .txt) are processed, so
+    other files are skipped when flag is "*".
+
+    Results are yielded as (filename, result) tuples, either in the order
+    returned by scrape_directory or as soon as each one is complete.
+
+    f must be picklable (eg binning or downsample_2d, or any other module-level
+    function), and, as with any use of multiprocessing, the calling script
+    should be guarded by if __name__ == '__main__'.
+
+    Example:
+    --------
+        for fname, (binned, idx) in process_directory(root, 'npy', binning, (100,)):
+            ...
+
+    Input:
+    --------
+    path : str
+        Directory to be scraped
+    flag : str
+        Extension of files to be processed (eg 'npy' or 'csv')
+    f : function
+        Reduction applied to each loaded array
+    f_args : tuple
+        Additional positional arguments passed to f (default f_args=())
+    f_kwds : dict or None
+        Keyword arguments passed to f (default f_kwds=None)
+    recursive : bool
+        If true, subdirectories of path are also processed (default recursive=True)
+    cores : int or None
+        Number of worker processes, all available cores if None (default cores=None)
+    buffer : int or None
+        Maximum number of files in flight at once, 2*cores if None
+        (default buffer=None)
+    ordered : bool
+        If true, results are yielded in file order, otherwise in order of
+        completion (default ordered=True)
+
+    Output:
+    --------
+    (fname, result) : tuple
+        Filename and value of f evaluated on its contents
+    '''
+    import os
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    if f_kwds is None:
+        f_kwds = {}
+    if cores is None:
+        cores = os.cpu_count() or 1
+    if buffer is None:
+        buffer = 2*cores
+    if cores < 1:
+        raise ValueError('cores must be at least 1')
+    if buffer < 1:
+        raise ValueError('buffer must be at least 1')
+    fnames = [fname for fname in scrape_directory(path, flag, recursive)
+              if os.path.splitext(fname)[1].lower() in _array_extensions]
+    pending = {}
+    finished = {}
+    next_submit = 0
+    next_yield = 0
+    with ProcessPoolExecutor(cores) as pool:
+        while next_yield < len(fnames):
+            #Keep the pool topped up without exceeding buffer
+            while (next_submit < len(fnames) and
+                   len(pending) + len(finished) < buffer):
+                future = pool.submit(_load_and_reduce, fnames[next_submit],
+                                     f, f_args, f_kwds)
+                pending[future] = next_submit
+                next_submit += 1
+            if pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished[pending.pop(future)] = future.result()
+            #Release results, holding back any that are ahead of file order
+            if ordered:
+                while next_yield in finished:
+                    yield fnames[next_yield], finished.pop(next_yield)
+                    next_yield += 1
+            else:
+                for idx in list(finished):
+                    yield fnames[idx], finished.pop(idx)
+                    next_yield += 1
+
 def soft_append(container, addendum):
     '''
     Appends addendum item to container only if addendum is not already member
@@ -144,7 +275,29 @@ def progress_counter(i, end, interval=None):
         print('%i / %i'%(i,end))
     return
 
-def binning(container, n_bins, cores=None):
+def _output_buffer(out, shape, dtype, result_type=None):
+    '''
+    Returns out if provided, after checking that it matches the expected shape
+    and dtype, otherwise allocates a new empty array. Used by the numeric
+    helpers that accept an out= argument.
+
+    If result_type is given, also checks that values of that type can be
+    written to the buffer without changing kind (eg floats into an int array).
+    '''
+    import numpy as np
+    if out is not None:
+        if out.shape != tuple(shape):
+            raise ValueError('out has shape %s, expected %s'%(out.shape, tuple(shape)))
+        if dtype is not None and out.dtype != np.dtype(dtype):
+            raise TypeError('out has dtype %s, expected %s'%(out.dtype, np.dtype(dtype)))
+        dtype = out.dtype
+    if result_type is not None and not np.can_cast(result_type, dtype, casting='same_kind'):
+        raise TypeError('Cannot store %s results in an array of dtype %s'%(np.dtype(result_type), np.dtype(dtype)))
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    return out
+
+def binning(container, n_bins, cores=None, dtype=None, out=None):
     '''
     Simple 1-dimensional binning algorithm. Reduces number of datapoints
     in a linear counting-style measurement, such that the input and output
@@ -158,41 +311,45 @@ def binning(container, n_bins, cores=None):
         number of bins in returned container
     cores : int
         number of cores to use for multiprocessing (planned feature)
+    dtype : numpy.dtype or None
+        dtype of new_container, float64 if None (default dtype=None)
+    out : numpy.array or None
+        preallocated array of length n_bins to hold new_container (default out=None)
 
     Output:
     --------
     new_container : numpy.array
         container object of length n_bins containing binned values
+    n_new_indices : numpy.array
+        normalized positions of the bins in new_container
     '''
     import numpy as np
-    ctype = type(container)
-    if ctype == np.ndarray:
-        old_shape = container.shape
-        try:
-            old_height, old_length = old_shape
-            binned_container = np.empty(shape=(old_height,n_bins))
-        except ValueError:
-            old_length = old_shape[0]
-            binned_container = np.empty(shape=n_bins)
-    elif ctype == list or ctype == tuple:
-        old_length = len(container)
-        binned_container = np.empty(shape=n_bins)
-    else:
-        print('Incompaible container type.')
-    container = np.array(container)
-    old_indices = np.array(range(old_length))
-    n_old_indices = old_indices/np.max(old_indices)
-    new_indices = np.array(range(n_bins))
-    n_new_indices = new_indices/np.max(new_indices)
+    if dtype is None and out is None:
+        dtype = np.float64
+    container = np.asarray(container)
+    new_container = _output_buffer(out, (n_bins,), dtype, container.dtype)
+    old_length = container.shape[0]
+    n_old_indices = np.arange(old_length, dtype=np.float64)
+    n_old_indices /= old_length - 1
+    n_new_indices = np.arange(n_bins, dtype=np.float64)
+    n_new_indices /= n_bins - 1
     index_gap = (n_new_indices[1] - n_new_indices[0])/2
-    new_container = np.empty(shape=(n_bins))
+    #Scratch buffers reused for every bin
+    diffs = np.empty_like(n_old_indices)
+    mask = np.empty(old_length, dtype=bool)
     for idx, n in enumerate(n_new_indices):
-        window = np.where(abs(n_old_indices - n) < index_gap)
-        old_values = container[window]
-        new_container[idx] = np.sum(old_values)
+        np.subtract(n_old_indices, n, out=diffs)
+        np.abs(diffs, out=diffs)
+        np.less(diffs, index_gap, out=mask)
+        #Indices are sorted, so each window is contiguous and can be summed as a view
+        window = np.flatnonzero(mask)
+        if window.size:
+            new_container[idx] = np.sum(container[window[0]:window[-1]+1])
+        else:
+            new_container[idx] = 0
     return new_container, n_new_indices
 
-def cartesian_distance(a, b):
+def cartesian_distance(a, b, dtype=None, out=None):
     '''
     Calculates the distance between two points within a cartesian coordinate plane
 
@@ -204,15 +361,31 @@ def cartesian_distance(a, b):
         b : tuple or list
         Second point to consider for distance calculation
 
+        dtype : numpy.dtype or None
+        dtype used for the calculation, inferred from a and b if None (default dtype=None)
+
+        out : numpy.array or None
+        Preallocated array to hold distance when the coordinates are arrays (default out=None)
+
     Output:
     --------
-        distance : float
+        distance : float or numpy.array
         Distance between points a and b, expressed in the same units as the coordinates given for a and b
     '''
     import numpy as np
-    x1, y1 = a
-    x2, y2 = b
-    distance = np.sqrt((x2-x1)**2+(y2-y1)**2)
+    x1, y1 = [np.asarray(v) for v in a]
+    x2, y2 = [np.asarray(v) for v in b]
+    shape = np.broadcast(x1, y1, x2, y2).shape
+    result_type = np.result_type(x1, y1, x2, y2, 1.0)
+    if dtype is None and out is None:
+        dtype = result_type
+    distance = _output_buffer(out, shape, dtype, result_type)
+    #The y difference is taken first, so out may safely overlap y1 or y2
+    dy = np.subtract(y2, y1)
+    np.subtract(x2, x1, out=distance)
+    np.hypot(distance, dy, out=distance)
+    if out is None and distance.ndim == 0:
+        return distance[()]
     return distance
 
 def fit_distribution(x, y, p, dist='gaussian'):
@@ -284,9 +457,11 @@ def find_quartiles(data):
     ranges and outliers.
     '''
     import numpy as np
-    data = list(data)
-    data.sort()
-    data = np.array(data)
+    if isinstance(data, np.ndarray):
+        data = np.sort(data)
+    else:
+        data = np.array(list(data))
+        data.sort()
     second = np.median(data)
     lower = data[np.where(data<=second)]
     upper = data[np.where(data>=second)]
@@ -311,54 +486,106 @@ def time_function(f, *args, **kwds):
     output = f(*args, **kwds)
     return time.time() - t0
 
-def apply_polynomial(x, c):
+def apply_polynomial(x, c, dtype=None, out=None):
     '''
     Applies nth order polynomial to input array x. n is equal to len(c) - 1.
 
     when c = (1, -2, 3), function is equivalent to:
-        f(x) = 3*x**2 - 2*x + 1
+        f(x) = x**2 - 2*x + 3
 
     Input:
     --------
         x : array-like
             data to be evaluated with polynomial
         c : array-like
-            polynomial coefficients in ascending polynomial order
+            polynomial coefficients in descending polynomial order
+        dtype : numpy.dtype or None
+            dtype of returned array, float64 if None (default dtype=None). Must
+            be able to hold the result type of x and c, eg an integer dtype
+            cannot be used with float x or float coefficients
+        out : numpy.array or None
+            preallocated array with the same shape as x to hold the result (default out=None)
     '''
     import numpy as np
     x = np.asarray(x)
-    y = np.empty_like(x, dtype=np.float64)
-    for i, xi in enumerate(x):
-        y_i = 0
-        for idx, coeff in enumerate(np.flip(c)):
-            y_i += (xi**idx)*coeff
-        y[i] = y_i
+    if dtype is None and out is None:
+        dtype = np.float64
+    y = _output_buffer(out, x.shape, dtype, np.result_type(x, *c))
+    #y is overwritten on every step, so x must not live in the same memory
+    if np.shares_memory(x, y):
+        x = x.copy()
+    #Horner's method, evaluated in place in y
+    if len(c) == 0:
+        y[...] = 0
+        return y
+    y[...] = c[0]
+    for coeff in c[1:]:
+        np.multiply(y, x, out=y)
+        np.add(y, coeff, out=y)
     return y
 
-def downsample_2d(array, target_resolution):
+def downsample_2d(array, target_resolution, dtype=None, out=None):
+    '''
+    Reduces the resolution of a 2D array by averaging over blocks of pixels.
+
+    Input:
+    --------
+        array : numpy.array
+            2D array to be downsampled
+        target_resolution : tuple of int
+            shape of the returned array
+        dtype : numpy.dtype or None
+            dtype of returned array, float32 if None (default dtype=None)
+        out : numpy.array or None
+            preallocated array of shape target_resolution to hold the result (default out=None)
+    '''
     import numpy as np
     initial_shape = array.shape
-    d_array = np.empty(shape=target_resolution, dtype=np.float32)
-    resample_axes = np.array([np.linspace(0, initial_shape[i], target_resolution[i]+1) for i in range(2)], dtype=int)
-    x = list(range(initial_shape[0]))
-    y = list(range(initial_shape[1]))
-    for i, row in enumerate(d_array):
-        for j, pixel in enumerate(row):
-            mask = ((resample_axes[0, i], resample_axes[0, i+1]),(resample_axes[1, j], resample_axes[1, j+1]))
-            window = array[mask[0][0]:mask[0][1], mask[1][0]:mask[1][1]]
+    if dtype is None and out is None:
+        dtype = np.float32
+    d_array = _output_buffer(out, tuple(target_resolution), dtype, np.result_type(array, 1.0))
+    rows, cols = [np.linspace(0, initial_shape[i], target_resolution[i]+1).astype(int) for i in range(2)]
+    for i in range(d_array.shape[0]):
+        for j in range(d_array.shape[1]):
+            window = array[rows[i]:rows[i+1], cols[j]:cols[j+1]]
             d_array[i,j] = np.mean(window)
-
-    return d_array
     return d_array
 
-def proxy_sort(template, data, reverse=False):
+def proxy_sort(template, data, reverse=False, dtype=None, out=None):
+    '''
+    Sorts data according to the order of the values in template.
+
+    Input:
+    --------
+        template : array-like
+            values whose sorted order is applied to data
+        data : array-like
+            values to be sorted, same length as template
+        reverse : bool
+            if true, data is sorted in descending order of template (default reverse=False)
+        dtype : numpy.dtype or None
+            if given, sorted data is returned as a numpy array of this dtype (default dtype=None)
+        out : numpy.array or None
+            preallocated array with the same shape as data to hold the result (default out=None)
+
+    Output:
+    --------
+        sorted_data : list or numpy.array
+            data sorted by template; a list unless dtype or out is given
+    '''
     import numpy as np
     order = np.argsort(template)
-    sorted_data = []
-    for i in order:
-        sorted_data.append(data[i])
     if reverse:
-        sorted_data.reverse()
+        order = order[::-1]
+    if dtype is None and out is None:
+        return [data[i] for i in order]
+    data = np.asarray(data)
+    sorted_data = _output_buffer(out, data.shape, dtype, data.dtype)
+    data = data.astype(sorted_data.dtype, copy=False)
+    if np.shares_memory(data, sorted_data):
+        data = data.copy()
+    #take copies out internally when mode='raise'; argsort indices are always in range
+    np.take(data, order, axis=0, out=sorted_data, mode='clip')
     return sorted_data
 
 def scatter3d(data_array, fname, labels=None):
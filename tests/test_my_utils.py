@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the numeric helpers write into preallocated out= buffers without
+making unnecessary copies of their inputs.
+"""
+
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import my_utils
+
+N = 100000
+
+def peak_memory(f, *args, **kwds):
+    '''
+    Calls f(*args, **kwds) and returns its output along with the peak number
+    of bytes allocated during the call.
+    '''
+    tracemalloc.start()
+    try:
+        output = f(*args, **kwds)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return output, peak
+
+@pytest.fixture
+def x():
+    return np.random.default_rng(0).random(N)
+
+def reference_binning(container, n_bins):
+    '''
+    Straightforward version of binning, masking the full container per bin.
+    '''
+    container = np.asarray(container)
+    old_indices = np.arange(len(container))/(len(container) - 1)
+    new_indices = np.arange(n_bins)/(n_bins - 1)
+    gap = (new_indices[1] - new_indices[0])/2
+    binned = np.array([np.sum(container[np.abs(old_indices - n) < gap]) for n in new_indices])
+    return binned, new_indices
+
+@pytest.mark.parametrize('length, n_bins', [(1000, 100), (11, 6), (37, 5), (500, 500), (1000, 37)])
+def test_binning_values(length, n_bins):
+    container = np.random.default_rng(length).random(length)
+    binned, indices = my_utils.binning(container, n_bins)
+    expected, expected_indices = reference_binning(container, n_bins)
+    assert np.array_equal(binned, expected)
+    assert np.array_equal(indices, expected_indices)
+    assert np.array_equal(my_utils.binning(list(range(length)), n_bins)[0],
+                          reference_binning(np.arange(length), n_bins)[0])
+
+def test_binning_out(x):
+    out = np.empty(100)
+    (result, _), peak = peak_memory(my_utils.binning, x, 100, out=out)
+    assert result is out
+    #Two index-sized scratch arrays plus a boolean mask, no copy of x
+    assert peak < 2.5*x.nbytes
+
+def test_apply_polynomial_out(x):
+    out = np.empty(N)
+    result, peak = peak_memory(my_utils.apply_polynomial, x, (1, -2, 3), out=out)
+    assert result is out
+    assert peak < 0.1*x.nbytes
+    assert np.allclose(result, x**2 - 2*x + 3)
+
+def test_downsample_2d_values():
+    array = np.random.default_rng(0).random((60, 48))
+    expected = array.reshape(6, 10, 4, 12).mean(axis=(1, 3))
+    assert np.allclose(my_utils.downsample_2d(array, (6, 4)), expected)
+    #Uneven blocks: rows are split at 0, 2, 5 and columns at 0, 2, 4
+    array = np.arange(20.).reshape(5, 4)
+    expected = [[array[0:2, 0:2].mean(), array[0:2, 2:4].mean()],
+                [array[2:5, 0:2].mean(), array[2:5, 2:4].mean()]]
+    assert np.allclose(my_utils.downsample_2d(array, (2, 2)), expected)
+
+def test_downsample_2d_out():
+    array = np.random.default_rng(0).random((1000, 1000))
+    out = np.empty((10, 10), dtype=np.float32)
+    result, peak = peak_memory(my_utils.downsample_2d, array, (10, 10), out=out)
+    assert result is out
+    assert peak < 0.05*array.nbytes
+
+def test_cartesian_distance_out(x):
+    out = np.empty(N)
+    result, peak = peak_memory(my_utils.cartesian_distance, (x, x), (2*x, 2*x), out=out)
+    assert result is out
+    #Only the y difference needs a temporary
+    assert peak < 1.5*out.nbytes
+    assert np.allclose(result, np.sqrt(2)*x)
+
+def test_proxy_sort_out(x):
+    out = np.empty(N)
+    result, peak = peak_memory(my_utils.proxy_sort, x, x, out=out)
+    assert result is out
+    #Only the argsort indices are allocated
+    assert peak < 1.5*x.nbytes
+    assert np.array_equal(result, np.sort(x))
+
+def test_out_dtype_mismatch():
+    with pytest.raises(TypeError):
+        my_utils.apply_polynomial(np.arange(3), (1, 0.5), dtype=np.int64)
+    with pytest.raises(TypeError):
+        my_utils.binning(np.arange(10.), 5, dtype=np.float64, out=np.empty(5, dtype=np.float32))
+    with pytest.raises(ValueError):
+        my_utils.downsample_2d(np.ones((4, 4)), (2, 2), out=np.empty((2, 3), dtype=np.float32))
+    with pytest.raises(TypeError):
+        my_utils.binning(np.random.default_rng(0).random(1000), 37, out=np.empty(37, dtype=np.int64))
+    with pytest.raises(TypeError):
+        my_utils.downsample_2d(np.random.default_rng(0).random((8, 8)), (2, 2), out=np.empty((2, 2), dtype=np.int32))
+    #Integer sums still fit integer buffers
+    out = np.empty(5, dtype=np.int64)
+    assert my_utils.binning(np.arange(100), 5, out=out)[0] is out
+
+def test_out_overlaps_input():
+    a = np.arange(6.)
+    assert my_utils.apply_polynomial(a, (2, 1), out=a) is a
+    assert np.array_equal(a, 2*np.arange(6.) + 1)
+    data = np.array([30., 10., 20.])
+    assert my_utils.proxy_sort([3, 1, 2], data, out=data) is data
+    assert np.array_equal(data, [10., 20., 30.])
+    x1, y1 = np.zeros(2), np.zeros(2)
+    assert my_utils.cartesian_distance((x1, y1), ([3., 6.], [4., 8.]), out=y1) is y1
+    assert np.array_equal(y1, [5., 10.])
+
+def test_proxy_sort_list():
+    data = [(1, 2), (3,), (4, 5, 6)]
+    assert my_utils.proxy_sort([3, 1, 2], data) == [(3,), (4, 5, 6), (1, 2)]
+    assert my_utils.proxy_sort([3, 1, 2], data, reverse=True) == [(1, 2), (4, 5, 6), (3,)]
+    assert my_utils.proxy_sort([2, 1], np.array([5, 6])) == [6, 5]
+
+def test_cartesian_distance_integer_input():
+    a = (np.array([0, 1]), np.array([0, 0]))
+    b = (np.array([3, 4]), np.array([4, 4]))
+    assert np.array_equal(my_utils.cartesian_distance(a, b), [5., 5.])
+    assert np.array_equal(my_utils.cartesian_distance(([0, 1], [0, 0]), ([3, 4], [4, 4])), [5., 5.])
+    assert my_utils.cartesian_distance((0, 0), (3, 4)) == 5.
+
+def test_find_quartiles_iterables():
+    expected = my_utils.find_quartiles(np.arange(10))
+    assert my_utils.find_quartiles(i for i in range(10)) == expected
+    assert my_utils.find_quartiles(set(range(10))) == expected
+
+@pytest.fixture
+def array_dir(tmp_path):
+    for i in range(6):
+        np.save(str(tmp_path / ('a%i.npy'%i)), np.arange(20.)*i)
+    np.savetxt(str(tmp_path / 'b.csv'), np.arange(4.)[None, :], delimiter=',')
+    (tmp_path / 'notes.md').write_text('not an array')
+    return str(tmp_path)
+
+def test_load_array(array_dir):
+    array = my_utils.load_array(os.path.join(array_dir, 'a2.npy'))
+    assert isinstance(array, np.memmap)
+    assert not array.flags.writeable
+    assert np.array_equal(array, np.arange(20.)*2)
+    row = my_utils.load_array(os.path.join(array_dir, 'b.csv'))
+    assert row.shape == (1, 4)
+    with pytest.raises(ValueError):
+        my_utils.load_array(os.path.join(array_dir, 'notes.md'))
+
+def test_process_directory_ordered(array_dir):
+    fnames = my_utils.scrape_directory(array_dir, 'npy')
+    results = list(my_utils.process_directory(array_dir, 'npy', np.sum,
+                                              cores=2, buffer=3))
+    assert [fname for fname, _ in results] == fnames
+    assert [total for _, total in results] == [np.sum(np.load(fname)) for fname in fnames]
+
+def test_process_directory_unordered(array_dir):
+    ordered = list(my_utils.process_directory(array_dir, 'npy', my_utils.binning,
+                                              (5,), dict(cores=7), cores=2))
+    unordered = list(my_utils.process_directory(array_dir, 'npy', my_utils.binning,
+                                                (5,), dict(cores=7), cores=2, ordered=False))
+    assert len(unordered) == len(ordered)
+    unordered = dict(unordered)
+    for fname, (binned, _) in ordered:
+        assert np.array_equal(unordered[fname][0], binned)
+
+def test_process_directory_wildcard(array_dir):
+    results = dict(my_utils.process_directory(array_dir, '*', np.sum, cores=2))
+    expected = [fname for fname in my_utils.scrape_directory(array_dir, '*')
+                if not fname.endswith('.md')]
+    assert sorted(results) == sorted(expected)
+    assert results[os.path.join(array_dir, 'b.csv')] == 6.
+
+@pytest.mark.parametrize('kwds', [dict(buffer=0), dict(buffer=-1), dict(cores=0)])
+def test_process_directory_validation(array_dir, kwds):
+    with pytest.raises(ValueError):
+        list(my_utils.process_directory(array_dir, 'npy', np.sum, **kwds))